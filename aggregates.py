@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+import typing
+from   typing import *
+
+min_py = (3, 8)
+
+###
+# Standard imports, starting with os and sys
+###
+import os
+import sys
+if sys.version_info < min_py:
+    print(f"This program requires Python {min_py[0]}.{min_py[1]}, or higher.")
+    sys.exit(os.EX_SOFTWARE)
+
+###
+# Other standard distro imports
+###
+import argparse
+import collections
+import contextlib
+import getpass
+mynetid = getpass.getuser()
+
+###
+# From hpclib
+###
+from   urdecorators import trap
+
+###
+# imports and objects that are a part of this project
+###
+
+
+###
+# Global objects and initializations
+###
+verbose = False
+
+###
+# Credits
+###
+__author__ = 'George Flanagin'
+__copyright__ = 'Copyright 2023, University of Richmond'
+__credits__ = None
+__version__ = 0.1
+__maintainer__ = 'George Flanagin, Alina Enikeeva'
+__email__ = ['gflanagin@richmond.edu', 'alina.enikeeva@richmond.edu']
+__status__ = 'in progress'
+__license__ = 'MIT'
+
+CLUSTER = "cluster"
+
+
+class Contribution(NamedTuple):
+    """
+    What one node adds to the totals of each partition it is in.
+    Memory is in GB, as on the screen. Used cores are kept in
+    hundredths so that adding and subtracting them never drifts.
+    measured is False when the used figures are unknown (zero).
+    """
+    partitions: tuple
+    state: str
+    alloc_cores: int = 0
+    used_cores: int = 0
+    total_cores: int = 0
+    alloc_mem: int = 0
+    used_mem: int = 0
+    total_mem: int = 0
+    measured: bool = False
+
+
+class Totals:
+    """
+    The running sums for one partition, or for the cluster.
+    unmeasured is how many of the nodes count nothing toward the used
+    figures because their usage is unknown.
+    """
+
+    __slots__ = ('nodes', 'unmeasured', 'alloc_cores', 'used_cores', 'total_cores',
+        'alloc_mem', 'used_mem', 'total_mem', 'states')
+
+    def __init__(self):
+        self.nodes = self.unmeasured = 0
+        self.alloc_cores = self.used_cores = self.total_cores = 0
+        self.alloc_mem = self.used_mem = self.total_mem = 0
+        self.states = collections.Counter()
+
+
+    def add(self, c:Contribution, sign:int=1) -> None:
+        self.nodes += sign
+        self.unmeasured += sign * (not c.measured)
+        self.alloc_cores += sign * c.alloc_cores
+        self.used_cores += sign * c.used_cores
+        self.total_cores += sign * c.total_cores
+        self.alloc_mem += sign * c.alloc_mem
+        self.used_mem += sign * c.used_mem
+        self.total_mem += sign * c.total_mem
+        self.states[c.state] += sign
+        if not self.states[c.state]: del self.states[c.state]
+
+
+    def line(self, name:str) -> str:
+        states = " ".join(f"{k}:{v}" for k, v in sorted(self.states.items()))
+        return (f"{name.ljust(10)} cores {self.alloc_cores:>5}/{self.total_cores:<5} "
+            f"used {self.used_cores/100:>8.2f} | mem {self.alloc_mem:>6} {self.used_mem:>6} "
+            f"{self.total_mem:>6} GB | {self.unmeasured:>3} unmeasured | {states}")
+
+
+class Aggregates:
+    """
+    Per-partition and cluster totals, kept up to date by subtracting
+    a node's old contribution and adding its new one. apply() costs
+    the same however many nodes there are; update() checks every node
+    in the snapshot for a change, but only adds up the ones that did.
+    """
+
+    def __init__(self):
+        self.contributions = {}
+        self.partitions = collections.defaultdict(Totals)
+        self.cluster = Totals()
+
+
+    def apply(self, node:str, c:Optional[Contribution]) -> bool:
+        """
+        Record the node's new contribution; None means the node is
+        gone. Returns True if anything changed.
+        """
+        old = self.contributions.get(node)
+        if old == c: return False
+
+        for new, sign in ((old, -1), (c, 1)):
+            if new is None: continue
+            self.cluster.add(new, sign)
+            for p in new.partitions:
+                self.partitions[p].add(new, sign)
+                if not self.partitions[p].nodes: del self.partitions[p]
+
+        if c is None:
+            del self.contributions[node]
+        else:
+            self.contributions[node] = c
+        return True
+
+
+    def update(self, snapshot:Dict[str, Contribution]) -> int:
+        """
+        Bring the totals in line with a complete snapshot. Returns the
+        number of nodes that changed.
+        """
+        changed = sum(self.apply(node, c) for node, c in snapshot.items())
+        for node in [ _ for _ in self.contributions if _ not in snapshot ]:
+            changed += self.apply(node, None)
+        return changed
+
+
+    def lines(self) -> List[str]:
+        """
+        One line per partition, then the cluster.
+        """
+        return [ self.partitions[p].line(p) for p in sorted(self.partitions) ] + [
+            self.cluster.line(CLUSTER) ]
+
+
+@trap
+def aggregates_main(myargs:argparse.Namespace) -> int:
+    a = Aggregates()
+    a.update({
+        "spdr01": Contribution(("basic",), "mix", 12, 1050, 52, 300, 120, 384, True),
+        "spdr02": Contribution(("basic",), "idle", 0, 3, 52, 0, 4, 384, True),
+        "spdr50": Contribution(("basic", "gpu"), "alloc", 52, 4800, 52, 700, 650, 768, True),
+        })
+    print("\n".join(a.lines()))
+    print()
+
+    a.apply("spdr01", Contribution(("basic",), "down"))
+    print("\n".join(a.lines()))
+
+    return os.EX_OK
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(prog="aggregates",
+        description="What aggregates does, aggregates does best.")
+
+    parser.add_argument('-o', '--output', type=str, default="",
+        help="Output file name")
+    parser.add_argument('-v', '--verbose', action='store_true',
+        help="Be chatty about what is taking place")
+
+
+    myargs = parser.parse_args()
+    verbose = myargs.verbose
+
+    try:
+        outfile = sys.stdout if not myargs.output else open(myargs.output, 'w')
+        with contextlib.redirect_stdout(outfile):
+            sys.exit(globals()[f"{os.path.basename(__file__)[:-3]}_main"](myargs))
+
+    except Exception as e:
+        print(f"Escaped or re-raised exception: {e}")
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+import typing
+from   typing import *
+
+min_py = (3, 8)
+
+###
+# Standard imports, starting with os and sys
+###
+import os
+import sys
+if sys.version_info < min_py:
+    print(f"This program requires Python {min_py[0]}.{min_py[1]}, or higher.")
+    sys.exit(os.EX_SOFTWARE)
+
+###
+# Other standard distro imports
+###
+import argparse
+import contextlib
+import getpass
+import glob
+import struct
+from   datetime import datetime
+mynetid = getpass.getuser()
+
+###
+# Installed libraries. numpy is only needed to analyze the history,
+# not to record it.
+###
+try:
+    import numpy as np
+except ImportError as e:
+    np = None
+
+###
+# From hpclib
+###
+from   urdecorators import trap
+
+###
+# imports and objects that are a part of this project
+###
+
+
+###
+# Global objects and initializations
+###
+verbose = False
+
+###
+# Credits
+###
+__author__ = 'George Flanagin'
+__copyright__ = 'Copyright 2023, University of Richmond'
+__credits__ = None
+__version__ = 0.1
+__maintainer__ = 'George Flanagin, Alina Enikeeva'
+__email__ = ['gflanagin@richmond.edu', 'alina.enikeeva@richmond.edu']
+__status__ = 'in progress'
+__license__ = 'MIT'
+
+###
+# Each history file is a 16 byte header followed by fixed-width,
+# little-endian records. A node in several partitions gets a record
+# for each of them; only the first is marked primary, so the node and
+# time window reports count each node once. Memory is in GB. Node
+# and partition names longer than NAME_BYTES are cut short.
+###
+MAGIC = b'SPDVHIST'
+VERSION = 2
+NAME_BYTES = 16
+HEADER = struct.Struct('<8sII')
+RECORD = struct.Struct(f'<{NAME_BYTES}s{NAME_BYTES}sdHHfIII?')
+
+DTYPE = None if np is None else np.dtype([
+    ('node', f'S{NAME_BYTES}'), ('partition', f'S{NAME_BYTES}'), ('time', '<f8'),
+    ('alloc_cores', '<u2'), ('total_cores', '<u2'), ('used_cores', '<f4'),
+    ('alloc_mem', '<u4'), ('used_mem', '<u4'), ('total_mem', '<u4'),
+    ('primary', '?')
+    ])
+
+# The quantities the reports add up, in the order they are kept.
+SUMMED = ('alloc_cores', 'used_cores', 'total_cores', 'alloc_mem', 'used_mem', 'total_mem')
+
+
+class HistoryWriter:
+    """
+    Appends one record per node and partition per refresh to the
+    newest file in directory, starting a new file when it reaches
+    max_bytes and deleting the oldest when there are more than keep.
+    """
+
+    def __init__(self, directory:str, max_bytes:int=64*2**20, keep:int=100, logger:object=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.logger = logger
+        self.f = None
+        self.truncated = set()
+        os.makedirs(directory, exist_ok=True)
+
+
+    def _rotate(self) -> None:
+        self.f is not None and self.f.close()
+
+        name = os.path.join(self.directory, f"history.{datetime.now().strftime('%Y%m%dT%H%M%S.%f')}.bin")
+        self.f = open(name, 'ab')
+        if not self.f.tell():
+            self.f.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+
+        for old in history_files(self.directory)[:-self.keep]:
+            os.unlink(old)
+
+
+    def _name(self, name:str) -> bytes:
+        """
+        The name as it fits in a record, with a warning the first time
+        one has to be cut short, because its records will be reported
+        under the shorter name, along with any others it now matches.
+        """
+        b = name.encode()
+        if len(b) > NAME_BYTES and name not in self.truncated:
+            self.truncated.add(name)
+            message = f"{name} is longer than {NAME_BYTES} bytes; recorded as {b[:NAME_BYTES]}"
+            if self.logger is not None:
+                self.logger.warning(message)
+            else:
+                print(message, file=sys.stderr)
+        return b[:NAME_BYTES]
+
+
+    def write(self, when:float, contributions:dict) -> int:
+        """
+        contributions is node -> aggregates.Contribution. Nodes that
+        were not measured are skipped. Returns the number of records
+        written.
+        """
+        if self.f is None or self.f.tell() >= self.max_bytes: self._rotate()
+
+        records = [ RECORD.pack(self._name(node), self._name(partition), when,
+                c.alloc_cores, c.total_cores, c.used_cores/100,
+                c.alloc_mem, c.used_mem, c.total_mem, not i)
+            for node, c in contributions.items() if c.measured
+                for i, partition in enumerate(c.partitions or ("",)) ]
+
+        self.f.write(b"".join(records))
+        self.f.flush()
+        return len(records)
+
+
+    def close(self) -> None:
+        self.f is not None and self.f.close()
+        self.f = None
+
+
+def history_files(directory:str) -> List[str]:
+    """
+    Oldest first; the timestamp in the name sorts correctly.
+    """
+    return sorted(glob.glob(os.path.join(directory, "history.*.bin")))
+
+
+def load(filename:str) -> 'np.ndarray':
+    """
+    Memory map a history file as a structured array. A partly
+    written last record is ignored.
+    """
+    with open(filename, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"{filename} is too short to be a history file")
+
+    magic, version, size = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION or size != DTYPE.itemsize:
+        raise ValueError(f"{filename} is not a version {VERSION} history file")
+
+    n = (os.path.getsize(filename) - HEADER.size) // DTYPE.itemsize
+    if not n: return np.zeros(0, dtype=DTYPE)
+    return np.memmap(filename, dtype=DTYPE, mode='r', offset=HEADER.size, shape=(n,))
+
+
+def reduce_by(keys:'np.ndarray', records:'np.ndarray', totals:dict) -> dict:
+    """
+    Add the SUMMED columns of records, grouped by keys, into totals,
+    which maps key -> [samples, *SUMMED].
+    """
+    if not len(keys): return totals
+
+    groups, which = np.unique(keys, return_inverse=True)
+    sums = np.vstack([ np.bincount(which, minlength=len(groups)) ] + [
+        np.bincount(which, weights=records[f], minlength=len(groups)) for f in SUMMED ])
+
+    for key, column in zip(groups.tolist(), sums.T):
+        if key in totals:
+            totals[key] += column
+        else:
+            totals[key] = column.astype(np.float64)
+    return totals
+
+
+def analyze(directory:str, window:int, since:float=0, until:float=float('inf')) -> Dict[str, dict]:
+    """
+    Reduce every history file in directory, one at a time, to totals
+    by node, by partition, and by time window. A file that cannot be
+    read, such as one from an older version, is skipped with a message.
+    """
+    reports = {"node": {}, "partition": {}, "window": {}}
+    for filename in history_files(directory):
+        try:
+            records = load(filename)
+        except (OSError, ValueError) as e:
+            print(f"Skipping {e}", file=sys.stderr)
+            continue
+
+        if since or until != float('inf'):
+            records = records[(records['time'] >= since) & (records['time'] < until)]
+
+        reduce_by(records['partition'], records, reports['partition'])
+
+        records = records[records['primary']]
+        reduce_by(records['node'], records, reports['node'])
+        reduce_by((records['time'] // window).astype(np.int64) * window, records, reports['window'])
+
+    return reports
+
+
+def report(title:str, totals:dict, label:Callable=str) -> str:
+    """
+    Efficiency is what was used as a percentage of what Slurm
+    allocated; average cores and memory are per sample.
+    """
+    lines = [ f"{title:<20} {'samples':>9} | {'cores alloc':>11} {'used':>8} {'eff%':>6} | "
+        f"{'mem alloc':>9} {'used':>8} {'eff%':>6}" ]
+    for key in sorted(totals):
+        n, alloc_cores, used_cores, _, alloc_mem, used_mem, _ = totals[key]
+        core_eff = 100*used_cores/alloc_cores if alloc_cores else float('nan')
+        mem_eff = 100*used_mem/alloc_mem if alloc_mem else float('nan')
+        lines.append(f"{label(key):<20} {int(n):>9} | {alloc_cores/n:>11.1f} {used_cores/n:>8.1f} "
+            f"{core_eff:>6.1f} | {alloc_mem/n:>9.1f} {used_mem/n:>8.1f} {mem_eff:>6.1f}")
+    return "\n".join(lines)
+
+
+@trap
+def history_main(myargs:argparse.Namespace) -> int:
+    if np is None:
+        print("analyze requires numpy.")
+        return os.EX_UNAVAILABLE
+
+    since = datetime.fromisoformat(myargs.since).timestamp() if myargs.since else 0
+    until = datetime.fromisoformat(myargs.until).timestamp() if myargs.until else float('inf')
+    reports = analyze(myargs.directory, myargs.window, since, until)
+
+    decode = lambda k: k.decode() or "(none)"
+    when = lambda k: datetime.fromtimestamp(k).strftime("%Y-%m-%d %H:%M")
+    print(report("node", reports['node'], decode), end="\n\n")
+    print(report("partition", reports['partition'], decode), end="\n\n")
+    print(report("window", reports['window'], when))
+
+    return os.EX_OK
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(prog="history",
+        description="Reports on the history that spydurview --history records.")
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    analyzer = subparsers.add_parser('analyze',
+        help="Efficiency by node, by partition, and by time window.")
+    analyzer.add_argument('directory', type=str,
+        help="The directory given to spydurview --history.")
+    analyzer.add_argument('-w', '--window', type=int, default=3600,
+        help="Width of the time windows, in seconds.")
+    analyzer.add_argument('--since', type=str, default="",
+        help="Ignore records before this ISO date/time.")
+    analyzer.add_argument('--until', type=str, default="",
+        help="Ignore records from this ISO date/time on.")
+    analyzer.add_argument('-o', '--output', type=str, default="",
+        help="Output file name")
+    analyzer.add_argument('-v', '--verbose', action='store_true',
+        help="Be chatty about what is taking place")
+
+
+    myargs = parser.parse_args()
+    verbose = myargs.verbose
+
+    try:
+        outfile = sys.stdout if not myargs.output else open(myargs.output, 'w')
+        with contextlib.redirect_stdout(outfile):
+            sys.exit(globals()[f"{os.path.basename(__file__)[:-3]}_main"](myargs))
+
+    except Exception as e:
+        print(f"Escaped or re-raised exception: {e}")
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+import typing
+from   typing import *
+
+min_py = (3, 8)
+
+###
+# Standard imports, starting with os and sys
+###
+import os
+import sys
+if sys.version_info < min_py:
+    print(f"This program requires Python {min_py[0]}.{min_py[1]}, or higher.")
+    sys.exit(os.EX_SOFTWARE)
+
+###
+# Other standard distro imports
+###
+import argparse
+import collections
+import contextlib
+import getpass
+import logging
+import queue
+import threading
+import time
+mynetid = getpass.getuser()
+
+###
+# From hpclib
+###
+from   urdecorators import trap
+
+###
+# imports and objects that are a part of this project
+###
+
+
+###
+# Global objects and initializations
+###
+verbose = False
+
+###
+# Credits
+###
+__author__ = 'George Flanagin'
+__copyright__ = 'Copyright 2023, University of Richmond'
+__credits__ = None
+__version__ = 0.1
+__maintainer__ = 'George Flanagin, Alina Enikeeva'
+__email__ = ['gflanagin@richmond.edu', 'alina.enikeeva@richmond.edu']
+__status__ = 'in progress'
+__license__ = 'MIT'
+
+
+class LogPipe:
+    """
+    Sits in front of a logger (anything with debug, info, warning,
+    error, and critical methods, such as urlogger.URLogger). Callers
+    only append to a queue; a single writer thread does the writing.
+
+    Each message has a key, by default the file and line that logged
+    it. Each key gets a bucket of burst messages that refills at rate
+    per second. When the bucket is empty, only every sample-th message
+    gets through (0 means none do), and the next one that does get
+    through says how many were suppressed.
+
+    Messages below level are dropped at once, before any of that. A
+    caller that has to work to build a message should first ask
+    isEnabledFor(), so that work is not done for nothing.
+    """
+
+    LEVELS = {
+        'debug': logging.DEBUG, 'info': logging.INFO, 'warning': logging.WARNING,
+        'error': logging.ERROR, 'critical': logging.CRITICAL
+        }
+
+    def __init__(self, target:object, level:int=logging.NOTSET, rate:float=1.0, burst:int=5, sample:int=0):
+        self.target = target
+        self.level = level
+        self.rate = rate
+        self.burst = burst
+        self.sample = sample
+
+        # key -> [tokens, time of last refill, number suppressed]
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+        self.q = queue.SimpleQueue()
+        self.writer = threading.Thread(target=self._drain, name="logpipe", daemon=True)
+        self.writer.start()
+
+        # A forked child has the queue, but not the thread that empties
+        # it, so the child writes directly.
+        os.register_at_fork(after_in_child=self._after_fork)
+
+
+    def __getattr__(self, name:str) -> object:
+        if name == 'target': raise AttributeError(name)
+        return getattr(self.target, name)
+
+
+    def _after_fork(self) -> None:
+        self.q = None
+        self.lock = threading.Lock()
+
+
+    def _drain(self) -> None:
+        while (item := self.q.get()) is not None:
+            level, msg = item
+            try:
+                getattr(self.target, level)(msg)
+            except Exception as e:
+                pass
+
+
+    def _admit(self, key:Hashable) -> Optional[int]:
+        """
+        Returns None if the message is to be dropped, otherwise
+        the number of messages with this key that were dropped
+        since the last one that got through.
+        """
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.setdefault(key, [self.burst, now, 0])
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+            elif self.sample and not (bucket[2] + 1) % self.sample:
+                pass
+            else:
+                bucket[2] += 1
+                return None
+
+            suppressed, bucket[2] = bucket[2], 0
+            return suppressed
+
+
+    def isEnabledFor(self, level:int) -> bool:
+        return level >= self.level
+
+
+    def log(self, level:str, msg:str, key:Hashable=None) -> None:
+        if self.LEVELS[level] < self.level: return
+
+        if key is None:
+            caller = sys._getframe(2)
+            key = (caller.f_code.co_filename, caller.f_lineno)
+
+        if (suppressed := self._admit(key)) is None: return
+        if suppressed: msg = f"{msg} ({suppressed} similar messages suppressed)"
+
+        if self.q is None:
+            getattr(self.target, level)(msg)
+        else:
+            self.q.put((level, msg))
+
+
+    def debug(self, msg:str, key:Hashable=None) -> None:
+        self.log('debug', msg, key)
+
+    def info(self, msg:str, key:Hashable=None) -> None:
+        self.log('info', msg, key)
+
+    def warning(self, msg:str, key:Hashable=None) -> None:
+        self.log('warning', msg, key)
+
+    def error(self, msg:str, key:Hashable=None) -> None:
+        self.log('error', msg, key)
+
+    def critical(self, msg:str, key:Hashable=None) -> None:
+        self.log('critical', msg, key)
+
+
+    def close(self) -> None:
+        """
+        Write whatever is still queued, and stop the writer.
+        """
+        if self.q is None or not self.writer.is_alive(): return
+        self.q.put(None)
+        self.writer.join()
+
+
+class CycleSummary:
+    """
+    Counts and values accumulated over one refresh, written as a
+    single line of key=value pairs rather than a line per node.
+    """
+
+    def __init__(self, name:str):
+        self.name = name
+        self.reset()
+
+
+    def reset(self) -> None:
+        self.counts = collections.Counter()
+        self.values = {}
+        self.start = time.monotonic()
+
+
+    def count(self, key:str, n:int=1) -> None:
+        self.counts[key] += n
+
+
+    def note(self, key:str, value:object) -> None:
+        self.values[key] = value
+
+
+    def __str__(self) -> str:
+        fields = {"elapsed": f"{time.monotonic() - self.start:.2f}s", **self.values, **self.counts}
+        return f"{self.name} " + " ".join(f"{k}={v}" for k, v in fields.items())
+
+
+    def emit(self, logger:object, level:str='info') -> None:
+        if isinstance(logger, LogPipe):
+            logger.log(level, str(self), key=self.name)
+        else:
+            getattr(logger, level)(str(self))
+        self.reset()
+
+
+@trap
+def logpipe_main(myargs:argparse.Namespace) -> int:
+    class Printer:
+        def __getattr__(self, level:str) -> Callable:
+            return lambda msg: print(f"{level.upper()} {msg}")
+
+    logger = LogPipe(Printer(), logging.INFO, rate=myargs.rate, burst=myargs.burst, sample=myargs.sample)
+    summary = CycleSummary("demo")
+    for i in range(myargs.n):
+        logger.info(f"message {i}")
+        summary.count("messages")
+    summary.emit(logger)
+    logger.close()
+
+    return os.EX_OK
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(prog="logpipe",
+        description="What logpipe does, logpipe does best.")
+
+    parser.add_argument('-b', '--burst', type=int, default=5,
+        help="Messages per key allowed before rate limiting begins.")
+    parser.add_argument('-n', type=int, default=100,
+        help="Number of messages to log in the demonstration.")
+    parser.add_argument('-o', '--output', type=str, default="",
+        help="Output file name")
+    parser.add_argument('-r', '--rate', type=float, default=1.0,
+        help="Messages per second per key, once the burst is used up.")
+    parser.add_argument('-s', '--sample', type=int, default=0,
+        help="When rate limited, let every n-th message through anyway.")
+    parser.add_argument('-v', '--verbose', action='store_true',
+        help="Be chatty about what is taking place")
+
+
+    myargs = parser.parse_args()
+    verbose = myargs.verbose
+
+    try:
+        outfile = sys.stdout if not myargs.output else open(myargs.output, 'w')
+        with contextlib.redirect_stdout(outfile):
+            sys.exit(globals()[f"{os.path.basename(__file__)[:-3]}_main"](myargs))
+
+    except Exception as e:
+        print(f"Escaped or re-raised exception: {e}")
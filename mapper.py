@@ -17,6 +17,7 @@ if sys.version_info < min_py:
 # Other standard distro imports
 ###
 import argparse
+import collections
 import contextlib
 import getpass
 mynetid = getpass.getuser()
@@ -34,9 +35,11 @@ from   urdecorators import trap
 # imports and objects that are a part of this project
 ###
 import scaling
+from   sinfoparser import NodeRecord, node_table
 
 
 verbose = False
+sinfo_errors = collections.Counter()
 
 ###
 # Credits
@@ -62,31 +65,29 @@ def draw_map() -> dict:
     data = SeekINFO()
     memory_map = []
     core_map = []
-   
-    # We don't need the header row here is an example line:
-    #
-    # spdr12 424105 768000 up 52 12/40/0/52
-
-    for line in ( _ for _ in data.stdout.split('\n')[1:] if _ ):
-        node, free, total, status, true_cores, cores = line.split()
-        cores = cores.split('/')
-        used = int(total) - int(free)
-        scale=scaling_values[int(total)]
-        memory_map.append(f"{node} {scaling.row(used, total, scale)}")
-        core_map.append(f"{node} {scaling.row(cores[1], true_cores)}")
+
+    for node, record in data.items():
+        if not record.complete: continue
+        scale=scaling_values[record.memory]
+        memory_map.append(f"{node} {scaling.row(record.memory - record.free_mem, record.memory, scale)}")
+        core_map.append(f"{node} {scaling.row(record.idle_cores, record.total_cores)}")
 
     return {"memory":memory_map, "cores":core_map}
 
 @trap
-def SeekINFO() -> tuple:
-    cmd = 'sinfo -o "%n %e %m %t %c %C"'
-    data = SloppyTree(dorunrun(cmd, return_datatype=dict))
-    
-    if not data.OK:
-        verbose and print(f"sinfo failed: {data.code=}")
-        return os.EX_DATAERR
+def SeekINFO() -> Dict[str, NodeRecord]:
+    """
+    The current sinfo records, keyed by node name. Fields that
+    could not be parsed are None, and are counted in sinfo_errors.
+    """
+    global sinfo_errors
+
+    sinfo_errors.clear()
+    data = node_table(sinfo_errors)
+
+    if sinfo_errors:
+        verbose and print(f"sinfo parse errors: {dict(sinfo_errors)}")
 
-    verbose and print(data.stdout)
     return data
 
                 
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+import typing
+from   typing import *
+
+min_py = (3, 8)
+
+###
+# Standard imports, starting with os and sys
+###
+import os
+import sys
+if sys.version_info < min_py:
+    print(f"This program requires Python {min_py[0]}.{min_py[1]}, or higher.")
+    sys.exit(os.EX_SOFTWARE)
+
+###
+# Other standard distro imports
+###
+import argparse
+import contextlib
+import getpass
+import math
+import socket
+import struct
+import threading
+import time
+mynetid = getpass.getuser()
+
+###
+# From hpclib
+###
+from   urdecorators import trap
+
+###
+# imports and objects that are a part of this project
+###
+
+
+###
+# Global objects and initializations
+###
+verbose = False
+
+###
+# Credits
+###
+__author__ = 'George Flanagin'
+__copyright__ = 'Copyright 2023, University of Richmond'
+__credits__ = None
+__version__ = 0.1
+__maintainer__ = 'George Flanagin, Alina Enikeeva'
+__email__ = ['gflanagin@richmond.edu', 'alina.enikeeva@richmond.edu']
+__status__ = 'in progress'
+__license__ = 'MIT'
+
+###
+# One datagram per sample: magic, version, when the agent started,
+# sequence number, the time on the node, 1 minute loadavg, MemTotal
+# and MemFree in kB, and then the node name. Well under a hundred bytes.
+###
+MAGIC = b'SPDV'
+VERSION = 2
+HEADER = struct.Struct('!4sBdIdfQQ')
+DEFAULT_PORT = 8383
+
+
+class Sample(NamedTuple):
+    node: str
+    started: float
+    seq: int
+    sent: float
+    load: float
+    mem_total: int
+    mem_free: int
+
+
+def read_sample(node:str, started:float, seq:int) -> Sample:
+    """
+    The same numbers that get_actual_cores_usage and get_actual_mem_usage
+    fetch over ssh, read from /proc on this node.
+    """
+    with open('/proc/loadavg') as f:
+        load = float(f.read().split()[0])
+
+    meminfo = {}
+    with open('/proc/meminfo') as f:
+        for line in f:
+            k, v = line.split(':', 1)
+            meminfo[k] = int(v.split()[0])
+            if 'MemTotal' in meminfo and 'MemFree' in meminfo: break
+
+    return Sample(node, started, seq, time.time(), load, meminfo['MemTotal'], meminfo['MemFree'])
+
+
+def pack(sample:Sample) -> bytes:
+    return HEADER.pack(MAGIC, VERSION, sample.started, sample.seq % 2**32, sample.sent,
+        sample.load, sample.mem_total, sample.mem_free) + sample.node.encode()
+
+
+def unpack(datagram:bytes) -> Sample:
+    magic, version, started, seq, sent, load, mem_total, mem_free = HEADER.unpack_from(datagram)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"not a version {VERSION} sample")
+    return Sample(datagram[HEADER.size:].decode(), started, seq, sent, load, mem_total, mem_free)
+
+
+@trap
+def run_agent(collector:tuple, interval:float, node:str=None) -> None:
+    """
+    Send a sample to the collector every interval seconds, forever.
+    """
+    node = socket.gethostname().split('.')[0] if node is None else node
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    started = time.time()
+    seq = 0
+    while True:
+        start = time.monotonic()
+        try:
+            sock.sendto(pack(read_sample(node, started, seq)), collector)
+        except OSError as e:
+            verbose and print(f"send to {collector} failed: {e}")
+
+        seq += 1
+        time.sleep(max(0, interval - (time.monotonic() - start)))
+
+
+class PushCollector:
+    """
+    Listens for samples from the agents, and keeps the latest one
+    from each node. A node that has not been heard from in stale_after
+    seconds is treated the same as one that ssh could not reach.
+    """
+
+    def __init__(self, port:int=DEFAULT_PORT, host:str='', stale_after:float=30):
+        self.stale_after = stale_after
+
+        # node -> (Sample, time received)
+        self.latest = {}
+        self.lost = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.address = self.sock.getsockname()
+        self.listener = threading.Thread(target=self._listen, name="nodeagent", daemon=True)
+        self.listener.start()
+
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                datagram, _ = self.sock.recvfrom(512)
+            except OSError as e:
+                return
+
+            try:
+                sample = unpack(datagram)
+            except Exception as e:
+                self.rejected += 1
+                continue
+
+            self.merge(sample)
+
+
+    def merge(self, sample:Sample) -> bool:
+        """
+        Keep the sample unless we already have a newer one from the same
+        run of the agent; within a run the sequence number orders them.
+        A sample with a different start is from a new run, and is kept
+        whichever way the node's clock moved in between, so a clock that
+        was stepped back cannot stall the node. Losses are only counted
+        within a run.
+        """
+        with self.lock:
+            previous = self.latest.get(sample.node)
+            if previous and previous[0].started == sample.started:
+                previous = previous[0]
+                if previous.seq >= sample.seq: return False
+                self.lost += sample.seq - previous.seq - 1
+            self.latest[sample.node] = (sample, time.monotonic())
+            return True
+
+
+    def usage(self) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        Used cores and used memory, keyed by node, in the same form
+        as ssh_probe returns them. Stale nodes are 'None'.
+        """
+        now = time.monotonic()
+        cores, mem = {}, {}
+        with self.lock:
+            for node, (sample, received) in self.latest.items():
+                if now - received > self.stale_after:
+                    cores[node] = mem[node] = 'None'
+                else:
+                    cores[node] = f"{sample.load:.2f}"
+                    mem[node] = str(math.ceil((sample.mem_total - sample.mem_free)/1000000))
+        return cores, mem
+
+
+    def stale(self) -> List[str]:
+        now = time.monotonic()
+        with self.lock:
+            return [ node for node, (_, received) in self.latest.items()
+                if now - received > self.stale_after ]
+
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+def address(s:str, default_port:int=None) -> tuple:
+    """
+    "host:port", ":port", or "port" -> (host, port), where a missing
+    host is '' (all interfaces). A bare "host" gets default_port, if
+    there is one. Used for --listen here, and for --listen and --http
+    in spydurview.
+    """
+    host, colon, port = s.strip().rpartition(':')
+    if not colon:
+        host, port = ('', s) if s.strip().isdigit() else (s.strip(), "")
+
+    if not port:
+        if default_port is None: raise ValueError(f"no port in {s!r}")
+        return host, default_port
+    return host, int(port)
+
+
+@trap
+def nodeagent_main(myargs:argparse.Namespace) -> int:
+    if myargs.collector:
+        run_agent(address(myargs.collector, DEFAULT_PORT), myargs.interval, myargs.name or None)
+        return os.EX_OK
+
+    host, port = address(myargs.listen, DEFAULT_PORT)
+    collector = PushCollector(port, host, stale_after=3*myargs.interval)
+    print(f"Listening on {collector.address}")
+    try:
+        while True:
+            time.sleep(myargs.interval)
+            cores, mem = collector.usage()
+            for node in sorted(cores):
+                print(f"{node} {cores[node]} {mem[node]}")
+            print(f"{collector.lost=} {collector.rejected=}")
+    except KeyboardInterrupt:
+        collector.close()
+
+    return os.EX_OK
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(prog="nodeagent",
+        description="Run on a compute node to push its load and memory to spydurview, or with --listen to print what arrives.")
+
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('-c', '--collector', type=str, default="",
+        help=f"host[:port] of the collector to send samples to; the port defaults to {DEFAULT_PORT}.")
+    group.add_argument('-l', '--listen', type=str, default="",
+        help="[host:]port on which to listen and print the samples received.")
+
+    parser.add_argument('-i', '--interval', type=float, default=10,
+        help="Seconds between samples.")
+    parser.add_argument('-n', '--name', type=str, default="",
+        help="Node name to report, if not the short hostname.")
+    parser.add_argument('-o', '--output', type=str, default="",
+        help="Output file name")
+    parser.add_argument('-v', '--verbose', action='store_true',
+        help="Be chatty about what is taking place")
+
+
+    myargs = parser.parse_args()
+    verbose = myargs.verbose
+
+    try:
+        outfile = sys.stdout if not myargs.output else open(myargs.output, 'w')
+        with contextlib.redirect_stdout(outfile):
+            sys.exit(globals()[f"{os.path.basename(__file__)[:-3]}_main"](myargs))
+
+    except Exception as e:
+        print(f"Escaped or re-raised exception: {e}")
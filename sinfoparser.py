@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+import typing
+from   typing import *
+
+min_py = (3, 8)
+
+###
+# Standard imports, starting with os and sys
+###
+import os
+import sys
+if sys.version_info < min_py:
+    print(f"This program requires Python {min_py[0]}.{min_py[1]}, or higher.")
+    sys.exit(os.EX_SOFTWARE)
+
+###
+# Other standard distro imports
+###
+import argparse
+import collections
+import contextlib
+import getpass
+import json
+import subprocess
+mynetid = getpass.getuser()
+
+###
+# From hpclib
+###
+from   urdecorators import trap
+
+###
+# imports and objects that are a part of this project
+###
+
+
+###
+# Global objects and initializations
+###
+verbose = False
+
+###
+# Credits
+###
+__author__ = 'George Flanagin'
+__copyright__ = 'Copyright 2023, University of Richmond'
+__credits__ = None
+__version__ = 0.1
+__maintainer__ = 'George Flanagin, Alina Enikeeva'
+__email__ = ['gflanagin@richmond.edu', 'alina.enikeeva@richmond.edu']
+__status__ = 'in progress'
+__license__ = 'MIT'
+
+###
+# Each field in the schema is the sinfo -O (--Format) type, the name(s)
+# of the attribute(s) it fills in the NodeRecord, and the function that
+# turns the text into the value(s). The -O format string is built from
+# the schema, so the two can never disagree. -O rather than -o because
+# AllocMem has no % code.
+###
+
+# The characters that sinfo appends to the compact state (StateCompact).
+STATE_SUFFIXES = "*~#!%$@^-"
+
+# Anything that cannot appear in a node name, a number, or a state.
+# sinfo -O puts it after each column, padded out to WIDTH.
+DELIMITER = "|"
+WIDTH = 64
+
+
+def split_state(s:str) -> tuple:
+    """
+    "mix*" -> ("mix", "*"); "idle" -> ("idle", "")
+    """
+    s = s.strip()
+    if not s: raise ValueError("empty state")
+    return (s[:-1], s[-1]) if s[-1] in STATE_SUFFIXES else (s, "")
+
+
+def split_cpus(s:str) -> tuple:
+    """
+    "12/40/0/52" -> (12, 40, 0, 52), which is allocated, idle,
+    other, and total.
+    """
+    values = tuple(int(_) for _ in s.strip().split('/'))
+    if len(values) != 4: raise ValueError(f"expected A/I/O/T, got {s}")
+    return values
+
+
+class Field(NamedTuple):
+    code: str
+    names: tuple
+    convert: Callable
+
+
+SINFO_FIELDS = (
+    Field('NodeHost', ('node',), lambda s: s.strip()),
+    Field('FreeMem', ('free_mem',), int),
+    Field('Memory', ('memory',), int),
+    Field('AllocMem', ('alloc_mem',), int),
+    Field('StateCompact', ('state', 'suffix'), split_state),
+    Field('CPUs', ('cpus',), int),
+    Field('CPUsState', ('alloc_cores', 'idle_cores', 'other_cores', 'total_cores'), split_cpus),
+    Field('Partition', ('partitions',), lambda s: (s.strip().rstrip('*'),) if s.strip() else ()),
+    )
+
+SINFO_FORMAT = ",".join(f"{_.code}:{WIDTH}{DELIMITER}" for _ in SINFO_FIELDS)
+
+
+class NodeRecord(NamedTuple):
+    """
+    One node as reported by sinfo. Memory is in MB; alloc_mem is
+    what Slurm has allocated to jobs, and memory - free_mem is what
+    the OS reports as in use. Any field that could not be parsed is
+    None rather than being silently dropped.
+    """
+    node: str
+    free_mem: Optional[int]
+    memory: Optional[int]
+    alloc_mem: Optional[int]
+    state: Optional[str]
+    suffix: Optional[str]
+    cpus: Optional[int]
+    alloc_cores: Optional[int]
+    idle_cores: Optional[int]
+    other_cores: Optional[int]
+    total_cores: Optional[int]
+    partitions: Optional[tuple]
+
+    @property
+    def complete(self) -> bool:
+        return None not in self
+
+
+def parse_line(line:str, errors:collections.Counter) -> Optional[NodeRecord]:
+    """
+    Turn one line of `sinfo -O SINFO_FORMAT` output into a NodeRecord.
+    Failures are counted in errors, by field name, and the field is
+    left as None.
+    """
+    line = line.rstrip('\n')
+    if not line.strip(): return None
+
+    # Every column, the last included, ends with the delimiter.
+    columns = line.split(DELIMITER)
+    if columns[-1].strip() == "": columns.pop()
+    if len(columns) != len(SINFO_FIELDS):
+        errors['columns'] += 1
+        return None
+
+    values = {}
+    for field, text in zip(SINFO_FIELDS, columns):
+        try:
+            v = field.convert(text)
+            values.update(zip(field.names, v if len(field.names) > 1 else (v,)))
+        except Exception as e:
+            for name in field.names:
+                errors[name] += 1
+                values[name] = None
+
+    if not values['node']:
+        errors['node'] += 1
+        return None
+
+    return NodeRecord(**values)
+
+
+###
+# sinfo --json, available in Slurm 21.08 and later. The node list is
+# the same shape as `scontrol show nodes --json`; newer versions wrap
+# numbers as {"set": true, "number": n} and give state as a list of
+# flags, so both are handled.
+###
+JSON_STATES = {
+    "allocated": "alloc", "completing": "comp", "down": "down",
+    "drained": "drain", "draining": "drng", "fail": "fail",
+    "failing": "failg", "future": "futr", "idle": "idle",
+    "maintenance": "maint", "mixed": "mix", "powered_down": "pow_dn",
+    "powering_up": "pow_up", "reserved": "resv", "unknown": "unk"
+    }
+
+JSON_SUFFIXES = {
+    "not_responding": "*", "powered_down": "~", "powering_up": "#",
+    "power_down": "!", "powering_down": "%", "maintenance": "$",
+    "reboot_requested": "@", "reboot_issued": "^"
+    }
+
+
+def _number(v:object) -> int:
+    if isinstance(v, dict):
+        if not v.get('set', True) or v.get('infinite'): raise ValueError(f"{v}")
+        v = v['number']
+    return int(v)
+
+
+def _json_state(node:dict) -> tuple:
+    state = node.get('state')
+    flags = [ _.lower() for _ in node.get('state_flags', []) ]
+    if isinstance(state, list):
+        state, flags = state[0], [ _.lower() for _ in state[1:] ] + flags
+    # A state we have no compact code for is kept as is, just as
+    # split_state keeps whatever StateCompact prints.
+    state = JSON_STATES.get(state.lower(), state.lower())
+
+    if 'drain' in flags:
+        state = 'drng' if state in ('alloc', 'mix', 'comp') else 'drain'
+    suffix = next((JSON_SUFFIXES[_] for _ in flags if _ in JSON_SUFFIXES), "")
+    return state, suffix
+
+
+JSON_FIELDS = (
+    (('node',), lambda n: n['name']),
+    (('free_mem',), lambda n: _number(n['free_memory'])),
+    (('memory',), lambda n: _number(n['real_memory'])),
+    (('alloc_mem',), lambda n: _number(n['alloc_memory'])),
+    (('state', 'suffix'), _json_state),
+    (('cpus',), lambda n: _number(n['cpus'])),
+    (('alloc_cores', 'idle_cores', 'other_cores', 'total_cores'),
+        lambda n: (_number(n['alloc_cpus']), _number(n['idle_cpus']),
+            _number(n['cpus']) - _number(n['alloc_cpus']) - _number(n['idle_cpus']),
+            _number(n['cpus']))),
+    (('partitions',), lambda n: tuple(n.get('partitions', ()))),
+    )
+
+
+def parse_json_node(node:dict, errors:collections.Counter) -> Optional[NodeRecord]:
+    values = {}
+    for names, convert in JSON_FIELDS:
+        try:
+            v = convert(node)
+            values.update(zip(names, v if len(names) > 1 else (v,)))
+        except Exception as e:
+            for name in names:
+                errors[name] += 1
+                values[name] = None
+
+    if not values['node']:
+        errors['node'] += 1
+        return None
+
+    return NodeRecord(**values)
+
+
+# None until we know; False once sinfo has answered in a JSON dialect
+# we cannot read, or has never answered --json at all after
+# JSON_ATTEMPTS tries (an sinfo too old to have the option).
+json_available = None
+json_failures = 0
+JSON_ATTEMPTS = 3
+
+
+def _read_json(errors:collections.Counter) -> Optional[list]:
+    """
+    Returns the records from `sinfo --json`, or None to use the text
+    output instead. A failed or garbled run only affects this call;
+    slurmctld may just have been unreachable for a moment.
+    """
+    global json_available, json_failures
+
+    with subprocess.Popen(('sinfo', '--json'), stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, text=True) as p:
+        try:
+            doc = json.load(p.stdout)
+        except json.JSONDecodeError as e:
+            doc = None
+        p.wait()
+
+    if p.returncode or not isinstance(doc, dict):
+        json_failures += 1
+        if json_available is None and json_failures >= JSON_ATTEMPTS:
+            json_available = False
+        return None
+
+    json_failures = 0
+    nodes = doc.get('nodes')
+    if not isinstance(nodes, list) or (nodes and not isinstance(nodes[0], dict)):
+        json_available = False
+        return None
+
+    json_available = True
+    return [ _ for _ in (parse_json_node(n, errors) for n in nodes) if _ ]
+
+
+def _read_text(errors:collections.Counter) -> Iterator[NodeRecord]:
+    """
+    Parse the text output line by line as it arrives from the pipe.
+    """
+    cmd = ('sinfo', '--Node', '--noheader', '-O', SINFO_FORMAT)
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, text=True) as p:
+        for line in p.stdout:
+            record = parse_line(line, errors)
+            if record: yield record
+
+    if p.returncode:
+        errors['sinfo'] += 1
+        verbose and print(f"sinfo failed: {p.returncode=}")
+
+
+@trap
+def read_nodes(errors:collections.Counter=None, use_json:bool=True) -> Iterator[NodeRecord]:
+    """
+    Generates a NodeRecord for each line of sinfo output. Uses
+    sinfo --json if this version of Slurm supports it. A node in
+    more than one partition will appear more than once.
+    """
+    errors = collections.Counter() if errors is None else errors
+
+    if use_json and json_available is not False:
+        try:
+            records = _read_json(errors)
+        except OSError as e:
+            records = None
+        if records is not None:
+            yield from records
+            return
+
+    yield from _read_text(errors)
+
+
+@trap
+def node_table(errors:collections.Counter=None, use_json:bool=True) -> Dict[str, NodeRecord]:
+    """
+    The current nodes, keyed by name. A node that sinfo lists once
+    per partition appears once, with all of its partitions.
+    """
+    table = {}
+    for record in read_nodes(errors, use_json):
+        previous = table.get(record.node)
+        if previous is not None and previous.partitions and record.partitions:
+            record = previous._replace(partitions=previous.partitions + record.partitions)
+        table[record.node] = record
+    return table
+
+
+@trap
+def sinfoparser_main(myargs:argparse.Namespace) -> int:
+    errors = collections.Counter()
+    for record in read_nodes(errors, not myargs.text):
+        print(record)
+
+    print(f"{json_available=} {dict(errors)=}")
+    return os.EX_OK
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(prog="sinfoparser",
+        description="What sinfoparser does, sinfoparser does best.")
+
+    parser.add_argument('-o', '--output', type=str, default="",
+        help="Output file name")
+    parser.add_argument('-t', '--text', action='store_true',
+        help="Parse the text output of sinfo even if --json is available.")
+    parser.add_argument('-v', '--verbose', action='store_true',
+        help="Be chatty about what is taking place")
+
+
+    myargs = parser.parse_args()
+    verbose = myargs.verbose
+
+    try:
+        outfile = sys.stdout if not myargs.output else open(myargs.output, 'w')
+        with contextlib.redirect_stdout(outfile):
+            sys.exit(globals()[f"{os.path.basename(__file__)[:-3]}_main"](myargs))
+
+    except Exception as e:
+        print(f"Escaped or re-raised exception: {e}")
@@ -17,15 +17,16 @@ if sys.version_info < min_py:
 # Other standard distro imports
 ###
 import argparse
+import atexit
 import contextlib
 import curses
 import curses.panel
 from   curses import wrapper
 from   datetime import datetime
 import getpass
-import fcntl
 import logging
 import re
+import subprocess
 import time
 import math
 mynetid = getpass.getuser()
@@ -44,6 +45,11 @@ import urlogger
 # imports and objects that are a part of this project
 ###
 from   mapper import *
+import logpipe
+import nodeagent
+import webview
+from   aggregates import Aggregates, Contribution
+import history
 verbose = False
 
 ###
@@ -58,7 +64,14 @@ __email__ = 'hpc@richmond.edu'
 __status__ = 'in progress'
 __license__ = 'MIT'
 
-DAT_FILE=os.path.join(os.getcwd(), 'info.dat')
+# When --listen is given, a nodeagent.PushCollector replaces ssh_probe.
+collector = None
+
+# Partition and cluster totals, updated by get_info.
+aggregates = Aggregates()
+
+# When --history is given, get_info appends each refresh to it.
+history_writer = None
 
 suffix_keys = tuple("*~#!%$@^-")
 suffix_values = (
@@ -121,175 +134,209 @@ def get_list_of_nodes() -> dict:
     abbreviation and a boolean to indicate whether the node
     is reachable.
     """
-    result = dorunrun('sinfo -o "%n %t"', return_datatype = str)
-
-    info = result.split('\n')[1:]
     node_dict = {}
-    for line in info:
-        node, state = line.split()
-        node_dict[node] = state
+    for node, record in SeekINFO().items():
+        node_dict[node] = f"{record.state}{record.suffix}" if record.state else "unk"
 
     return node_dict
     
 
 @trap
-def get_info() -> dict:
+def get_info(data:dict=None) -> list:
     global logger, myargs
-    logger.info(piddly("get_info"))
     """
-    Get the map with all the cores and memory information
+    Get the map with all the cores and memory information. data
+    is the node table from SeekINFO(); if not supplied, sinfo
+    is consulted.
     """
-    global DAT_FILE, suffixes, states
+    global suffixes, states, collector, aggregates, history_writer
 
-    data = SeekINFO()
+    summary = logpipe.CycleSummary("get_info")
+    data = SeekINFO() if data is None else data
     core_map_and_mem = []
+    contributions = {}
     actually_used_cores = {}   
     actually_used_mem = {}
     
-    # multiprocessing to ssh to each node and get info on
-    # actually used memory and cores
-    fork_ssh(myargs.input) 
-   
-    # fork_ssh writes to info.dat
-    # collect information into the dictionary
-    with open(DAT_FILE) as infodat:
-        #infodat.seek(0)
-        
-        for line in infodat.readlines():
-            node = core = mem = ""
-            try:
-                node, core, mem = line.split()
-                actually_used_cores[node] = core 
-                actually_used_mem[node] = mem
-            except Exception as e:
-                logger.error(piddly(f"Failed to read {line=}"))
+    if collector is not None:
+        # the agents have already pushed what we would ssh for.
+        actually_used_cores, actually_used_mem = collector.usage()
+        summary.count("stale", len(collector.stale()))
+        summary.note("lost", collector.lost)
+
+    else:
+        # ssh to each node, in parallel, for the actually used
+        # memory and cores
+        actually_used_cores, actually_used_mem = ssh_probe(myargs.input, summary)
 
-    for line in ( _ for _ in data.stdout.split('\n')[1:] if _ ):
+    for field, n in sinfo_errors.items():
+        summary.count(f"sinfo_bad_{field}", n)
+
+    for node, record in data.items():
+        if node not in myargs.input: continue
         
         try: 
-            node, free, total, status, true_cores, cores = line.split()
+            used_cores = actually_used_cores.get(node, 'None')
+            used_mem = actually_used_mem.get(node, 'None')
 
-            cores = cores.split('/')
-            allocated_mem = (int(total) - int(free))/1000 # GB
-        
-            alloc_cores = scaling.row(cores[0], true_cores)
-            alloc_mem = str(math.ceil(allocated_mem))
-
-            used_cores = actually_used_cores[node]
-            used_mem = actually_used_mem[node]
-            #print(node, used_cores, used_mem)
-            total_mem_formatted = str(math.ceil(int(total)/1000))
-
-            if used_cores == 'None':# or used_mem == 'None':
-                suffix = ""
-                text = ""
-                if status[-1] in suffixes:
-                    status, suffix = status[:-1], status[-1]
-                    text = states.get(status, 'status unknown')
-                    if suffix: text = f"{text} and {suffixes.get('suffix', 'N/A')}"
+            contributions[node] = contribution(record, used_cores, used_mem)
+
+            if used_cores == 'None' or not record.complete:
+                text = states.get(record.state, 'status unknown')
+                if record.suffix: text = f"{text} and {suffixes.get(record.suffix, 'N/A')}"
                 core_map_and_mem.append(f"{node} is {text}.")
-            else:
-                core_map_and_mem.append(f"{node} {alloc_cores} {used_cores.rjust(10)} | {alloc_mem.rjust(6)}  {used_mem.rjust(6)}  {total_mem_formatted.rjust(6)} ")
+                summary.count("rows_down")
+                continue
+
+            alloc_cores = scaling.row(record.alloc_cores, record.total_cores)
+            alloc_mem = str(math.ceil(record.alloc_mem/1000)) # GB
+            total_mem_formatted = str(math.ceil(record.memory/1000))
+
+            core_map_and_mem.append(f"{node} {alloc_cores} {used_cores.rjust(10)} | {alloc_mem.rjust(6)}  {used_mem.rjust(6)}  {total_mem_formatted.rjust(6)} ")
+            summary.count("rows_up")
                
         except Exception as e:
-            logger.info(piddly(f"{e}"))
+            summary.count("row_errors")
+            logger.isEnabledFor(logging.DEBUG) and logger.debug(piddly(f"{node} {e}"))
 
+    summary.note("changed", aggregates.update(contributions))
+    if history_writer is not None:
+        summary.note("recorded", history_writer.write(time.time(), contributions))
+    summary.emit(logger)
     return core_map_and_mem
 
 @trap
-def fork_ssh(list_of_nodes:dict) -> None:
+def contribution(record:NodeRecord, used_cores:str, used_mem:str) -> Contribution:
+    """
+    What this node adds to the totals. The allocated and total figures
+    come from sinfo; if we could not ask the node what it is using,
+    only the used figures are zero. A node whose sinfo record is
+    incomplete counts only toward the states.
+    """
+    partitions = record.partitions or ()
+    if not record.complete:
+        return Contribution(partitions, record.state or 'unk')
+
+    measured = used_cores != 'None'
+    return Contribution(partitions, record.state,
+        record.alloc_cores, round(float(used_cores)*100) if measured else 0, record.total_cores,
+        math.ceil(record.alloc_mem/1000), int(used_mem) if measured and used_mem.isdigit() else 0,
+        math.ceil(record.memory/1000), measured)
+
+# One ssh per node returns both the load and the memory lines.
+SSH_PROBE = "cat /proc/loadavg; head -2 /proc/meminfo"
+MAX_PROBES = 256
+PROBE_TIMEOUT = 10
+
+def parse_probe(output:str) -> tuple:
+    """
+    The output of SSH_PROBE -> (used cores, used memory in GB) as
+    strings, computed as get_actual_cores_usage and get_actual_mem_usage do.
+    """
+    lines = output.splitlines()
+    memtotal, memfree = ( int(re.findall(r'\d+', _)[0]) for _ in lines[1:3] )
+    return lines[0][:5].strip(), str(math.ceil((memtotal-memfree)/1000000))
+
+@trap
+def ssh_probe(list_of_nodes:dict, summary:logpipe.CycleSummary=None) -> tuple:
     '''
-    Multiprocesses to ssh to each node and retrieve this information 
-    in parallel, significantly speeding up the process.
+    Runs ssh to each reachable node in parallel, MAX_PROBES at a time,
+    and returns two dicts keyed by node: used cores and used memory.
+    A node that does not answer is left out.
+
+    The probes are started with subprocess rather than by forking this
+    interpreter, which has the logging, collector, and web threads
+    running; forking a threaded process copies whatever locks those
+    threads hold.
     '''
-    global DAT_FILE, logger
-    
-    try:
-        os.unlink(DAT_FILE)
-    except FileNotFoundError as e:
-        # This is OK; the file has already been deleted.
-        pass
-
-    except Exception as e:
-        # This is something else, let's find out what happened.
-        logger.error(piddly(f"Cannot continue. Unable to clear {DAT_FILE} because {e}."))
-        sys.exit(os.EX_IOERR)
+    global logger
 
-    pids = set()
+    summary = logpipe.CycleSummary("ssh_probe") if summary is None else summary
+    cores, mem = {}, {}
 
-    reachable_nodes = { node : state 
+    reachable_nodes = [ node 
         for node, state in list_of_nodes.items() 
-            if state[-1] not in suffixes and state[1:] not in 'd' }
+            if state[-1] not in suffixes and state[1:] not in 'd' ]
 
-    unreachable_nodes = { node : state 
-        for node, state in list_of_nodes.items() 
-            if node not in reachable_nodes }
+    summary.count("reachable", len(reachable_nodes))
+    summary.count("unreachable", len(list_of_nodes) - len(reachable_nodes))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(piddly(f"unreachable: {[ _ for _ in list_of_nodes if _ not in reachable_nodes ]}"))
 
-    if len(unreachable_nodes): logger.info(piddly(f"{unreachable_nodes.keys()=}"))
+    for i in range(0, len(reachable_nodes), MAX_PROBES):
+        probes = { node : subprocess.Popen(('ssh', '-o', 'ConnectTimeout=1', node, SSH_PROBE),
+                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL, text=True)
+            for node in reachable_nodes[i:i+MAX_PROBES] }
 
-    for node in reachable_nodes:            
+        deadline = time.monotonic() + PROBE_TIMEOUT
+        for node, p in probes.items():
+            try:
+                output, _ = p.communicate(timeout=max(0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired as e:
+                p.kill()
+                p.communicate()
+                summary.count("ssh_timeout")
+                continue
 
-        # Parent process records the child's PID.
-        if (pid := os.fork()):
-            pids.add(pid)
-            continue
+            if p.returncode or not output:
+                summary.count("ssh_no_answer")
+                continue
 
-        with open(DAT_FILE, 'a+') as infodat:
             try:
-                cores_used = -1
-                mem_used = -1
-                cores_used = get_actual_cores_usage(node)
-                mem_used   = get_actual_mem_usage(node)    
-
-                # each child process locks, writes to and unlocks the file
-                fcntl.lockf(infodat, fcntl.LOCK_EX)
-                infodat.write(f'{node} {cores_used} {mem_used}\n')
-                infodat.close()
-                
+                cores[node], mem[node] = parse_probe(output)
+                summary.count("ssh_ok")
             except Exception as e:
-                logger.error(piddly(f"query of {node} failed. {e}"))
-                pass
-
-            finally:
-                logger.info(piddly(f"{node} {cores_used} {mem_used}"))
-                os._exit(os.EX_OK)
+                summary.count("ssh_failed")
+                logger.isEnabledFor(logging.DEBUG) and logger.debug(piddly(f"query of {node} failed: {e}"))
 
-    # make sure all the child processes finished before the function 
-    # returns.
-    while pids:
-        # The zero in the argument means we wait for any child.
-        # The resulting pid is the child that sent us a SIGCHLD.
-        pid, exit_code, _ = os.wait3(0) 
-        pids.remove(pid)
+    return cores, mem
 
 
 @trap
-def how_busy(n:str) -> int:
+def how_busy(n:str, data:dict=None) -> int:
     """
-    Returns 0-n, corresponding to the activity on the node
+    Returns 0-n, corresponding to the activity on the node. data
+    is the node table from SeekINFO(); if not supplied, sinfo
+    is consulted.
     """
-    data = SeekINFO()
+    data = SeekINFO() if data is None else data
     busy_cores = 0
     busy_mem = 0
    
     try: 
-        n = n.split()[0]
-
-        for line in ( _ for _ in data.stdout.split('\n')[1:] if _ ):
-            node, free, total, status, true_cores, cores = line.split()
-            if node == n:     
-                cores = cores.split('/')
-                busy_cores = int(cores[0])/int(true_cores)
-
-                mem_used = int(total) - int(free)
-                busy_mem = mem_used/int(total)
-                
-                break 
+        record = data[n.split()[0]]
+        busy_cores = record.alloc_cores/record.total_cores
+        busy_mem = record.alloc_mem/record.memory
     except:
         pass
 
     return max(busy_cores, busy_mem) #, cores[1], true_cores
 
+@trap
+def classify(row:str, data:dict=None) -> str:
+    """
+    The color a row from get_info is shown in: red, yellow, or green.
+    """
+    if 'is' in row: # red, if the node status is down or if numof cores used is > 52
+        return "red"
+    elif (float(row.split()[2])>52.00):
+        return "red"
+    elif how_busy(row, data) >= 0.75: #if node is more than 75% full
+        return "yellow"
+    else:
+        return "green"
+
+@trap
+def collect_rows() -> dict:
+    """
+    One refresh for the web dashboard: each node's row from get_info
+    and the color it would be on the screen.
+    """
+    data = SeekINFO()
+    return { row.split()[0] : {"row": row, "level": classify(row, data)}
+        for row in get_info(data) }
+
 @trap
 def help_window(stdscr: object) -> None:
     """
@@ -329,6 +376,7 @@ def map_cores(stdscr: object) -> None:
     curses.init_pair(8, curses.COLOR_WHITE, curses.COLOR_BLACK)
     curses.init_pair(9, curses.COLOR_RED, curses.COLOR_BLACK)
     curses.init_pair(10, curses.COLOR_BLACK, curses.COLOR_WHITE)
+    curses.init_pair(11, curses.COLOR_CYAN, curses.COLOR_BLACK)
 
     #way 2 to use the color, uses a variable assignment
     BLUE_AND_YELLOW = curses.color_pair(1) 
@@ -341,6 +389,7 @@ def map_cores(stdscr: object) -> None:
     WHITE_AND_BLACK = curses.color_pair(8)
     RED_AND_BLACK = curses.color_pair(9)    
     BLACK_AND_WHITE = curses.color_pair(10)
+    CYAN_AND_BLACK = curses.color_pair(11)
 
 
     stdscr.clear()
@@ -411,19 +460,19 @@ def map_cores(stdscr: object) -> None:
                 window2.addstr(0, 0, header, WHITE_AND_BLACK)
                 window2.addstr(1, 0, subheader, WHITE_AND_BLACK)            
 
-                info = get_info()
+                data = SeekINFO()
+                info = get_info(data)
                 
+                totals = aggregates.lines()
+                for idx, line in enumerate(totals):
+                    window2.addstr(idx+2, 0, line, CYAN_AND_BLACK)
+                top = len(totals)+3
+
+                colors = {"red":RED_AND_BLACK, "yellow":YELLOW_AND_BLACK, "green":GREEN_AND_BLACK}
                 for idx, node in enumerate(sorted(info)):
-                    if 'is' in node: # red, if the node status is down or if numof cores used is > 52
-                        window2.addstr(idx+2, 0, node, RED_AND_BLACK)
-                    elif (float(node.split()[2])>52.00):
-                        window2.addstr(idx+2, 0, node, RED_AND_BLACK)
-                    elif how_busy(node) >= 0.75: #if node is more than 75% full
-                        window2.addstr(idx+2, 0, node, YELLOW_AND_BLACK)
-                    else:
-                        window2.addstr(idx+2, 0, node, GREEN_AND_BLACK)
-                window2.addstr(len(info)+2, 0, f'Last updated {datetime.now().strftime("%m/%d/%Y %H:%M:%S")}', WHITE_AND_BLACK)
-                window2.addstr(len(info)+3, 0, "Press q to quit, h for help OR any other key to refresh.", WHITE_AND_BLACK)
+                    window2.addstr(idx+top, 0, node, colors[classify(node, data)])
+                window2.addstr(len(info)+top, 0, f'Last updated {datetime.now().strftime("%m/%d/%Y %H:%M:%S")}', WHITE_AND_BLACK)
+                window2.addstr(len(info)+top+1, 0, "Press q to quit, h for help OR any other key to refresh.", WHITE_AND_BLACK)
                 window2.refresh()    
         except:
             pass 
@@ -498,11 +547,23 @@ def piddly(s:str) -> str:
 @trap
 def spydurview_main() -> int:
     #wrapper(draw_menu)
-    global logger, myargs
+    global logger, myargs, collector, history_writer
     logger.info(piddly("Entered spydurview_main"))
 
     myargs.input=get_host_names(myargs)
-    wrapper(map_cores)
+    if myargs.listen:
+        host, port = nodeagent.address(myargs.listen, nodeagent.DEFAULT_PORT)
+        collector = nodeagent.PushCollector(port, host, stale_after=myargs.stale)
+        logger.info(piddly(f"Listening for node agents on {collector.address}"))
+
+    if myargs.history:
+        history_writer = history.HistoryWriter(myargs.history, logger=logger)
+        atexit.register(history_writer.close)
+
+    if myargs.http:
+        webview.serve(nodeagent.address(myargs.http), collect_rows, myargs.refresh, logger)
+    else:
+        wrapper(map_cores)
     return os.EX_OK
 
 
@@ -513,18 +574,27 @@ if __name__ == '__main__':
 
     parser.add_argument('-r', '--refresh', type=int, default=60, 
         help="Refresh interval defaults to 60 seconds. Set to 0 to only run once.")
+    parser.add_argument('--http', type=str, default="",
+        help="[host:]port on which to serve a web dashboard instead of drawing the screen.")
+    parser.add_argument('--history', type=str, default="",
+        help="Directory in which to record each refresh, for `python history.py analyze`.")
     parser.add_argument('-i', '--input', type=str, default="",
         help="If present, --input is interpreted to be a whitespace delimited file of host names.")
+    parser.add_argument('-l', '--listen', type=str, default="",
+        help="[host:]port on which to receive samples from nodeagent.py, instead of using ssh.")
     parser.add_argument('-o', '--output', type=str, default="",
         help="Output file name")
-    parser.add_argument('-v', '--verbose', type=int, default=logging.DEBUG, 
+    parser.add_argument('-s', '--stale', type=int, default=30,
+        help="With --listen, seconds without a sample before a node is shown as unreachable.")
+    parser.add_argument('-v', '--verbose', type=int, default=logging.INFO, 
         help=f"Sets the loglevel. Values between {logging.NOTSET} and {logging.CRITICAL}.")
 
 
     myargs = parser.parse_args()
 
-    verbose = myargs.verbose if logging.NOTSET <= myargs.verbose <= logging.CRITICAL else logging.DEBUG
-    logger = urlogger.URLogger(level=myargs.verbose)
+    verbose = myargs.verbose if logging.NOTSET <= myargs.verbose <= logging.CRITICAL else logging.INFO
+    logger = logpipe.LogPipe(urlogger.URLogger(level=verbose), verbose)
+    atexit.register(logger.close)
 
 
     try:
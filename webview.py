@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+import typing
+from   typing import *
+
+min_py = (3, 8)
+
+###
+# Standard imports, starting with os and sys
+###
+import os
+import sys
+if sys.version_info < min_py:
+    print(f"This program requires Python {min_py[0]}.{min_py[1]}, or higher.")
+    sys.exit(os.EX_SOFTWARE)
+
+###
+# Other standard distro imports
+###
+import argparse
+import contextlib
+import getpass
+from   http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from   urllib.parse import urlparse, parse_qs
+mynetid = getpass.getuser()
+
+###
+# From hpclib
+###
+from   urdecorators import trap
+
+###
+# imports and objects that are a part of this project
+###
+from   nodeagent import address
+
+
+###
+# Global objects and initializations
+###
+verbose = False
+
+###
+# Credits
+###
+__author__ = 'George Flanagin'
+__copyright__ = 'Copyright 2023, University of Richmond'
+__credits__ = None
+__version__ = 0.1
+__maintainer__ = 'George Flanagin, Alina Enikeeva'
+__email__ = ['gflanagin@richmond.edu', 'alina.enikeeva@richmond.edu']
+__status__ = 'in progress'
+__license__ = 'MIT'
+
+# Seconds between comments on an idle event stream, to keep proxies
+# from closing it.
+KEEPALIVE = 15
+
+
+class NodeBoard:
+    """
+    The current row for each node, and the sequence number of the
+    update in which it last changed. A node that disappears is kept
+    as None so that clients learn it is gone.
+
+    The dict is kept in order of last change, so the changes since
+    any sequence number are found by walking back from the end, and
+    cost only as much as the number of nodes that changed.
+
+    Sequence numbers start over with each board, so the epoch tells
+    a client that reconnects after a restart that its number is
+    meaningless here.
+    """
+
+    def __init__(self):
+        self.epoch = f"{os.getpid():x}{time.time_ns():x}"
+        self.seq = 0
+        self.nodes = {}
+        self.changed = threading.Condition()
+        self._snapshot = None
+        self._deltas = {}
+
+
+    def update(self, rows:Dict[str, dict]) -> int:
+        """
+        rows is node -> whatever describes it. Returns the sequence
+        number, which only advances if something changed.
+        """
+        with self.changed:
+            seq = self.seq + 1
+            changes = { node : row for node, row in rows.items()
+                if node not in self.nodes or self.nodes[node][1] != row }
+            changes.update({ node : None for node, (_, row) in self.nodes.items()
+                if row is not None and node not in rows })
+            if not changes: return self.seq
+
+            for node, row in changes.items():
+                self.nodes.pop(node, None)
+                self.nodes[node] = (seq, row)
+
+            self.seq = seq
+            self._snapshot = None
+            self._deltas = {}
+            self.changed.notify_all()
+            return seq
+
+
+    def snapshot(self) -> Tuple[int, bytes]:
+        """
+        The whole table as JSON, built at most once per update however
+        many clients ask for it.
+        """
+        with self.changed:
+            if self._snapshot is None:
+                nodes = { node : row for node, (_, row) in self.nodes.items() if row is not None }
+                self._snapshot = json.dumps({"seq": self.seq, "nodes": nodes}).encode()
+            return self.seq, self._snapshot
+
+
+    def since(self, seq:int) -> Tuple[int, bytes]:
+        """
+        The nodes that changed after seq, as JSON. Clients that are
+        caught up all ask for the same delta, so it is built once.
+        From 0 it is the whole table, marked full so that the client
+        drops whatever it had before.
+        """
+        with self.changed:
+            if seq not in self._deltas:
+                delta = {}
+                for node, (changed, row) in reversed(self.nodes.items()):
+                    if changed <= seq: break
+                    delta[node] = row
+                self._deltas[seq] = json.dumps({"seq": self.seq, "full": not seq, "nodes": delta}).encode()
+            return self.seq, self._deltas[seq]
+
+
+    def wait(self, seq:int, timeout:float) -> bool:
+        """
+        Block until there is something newer than seq.
+        """
+        with self.changed:
+            return self.changed.wait_for(lambda: self.seq > seq, timeout)
+
+
+PAGE = b"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>spydurview</title>
+<style>
+body { background: black; color: white; font-family: monospace; }
+.red { color: red; } .yellow { color: yellow; } .green { color: lime; }
+</style></head>
+<body><pre id="nodes"></pre><div id="updated"></div>
+<script>
+const nodes = {};
+function draw() {
+    const pre = document.getElementById("nodes");
+    pre.replaceChildren();
+    for (const n of Object.keys(nodes).sort()) {
+        const span = document.createElement("span");
+        span.className = nodes[n].level;
+        span.textContent = nodes[n].row + "\\n";
+        pre.appendChild(span);
+    }
+    document.getElementById("updated").textContent = "Last updated " + new Date().toLocaleString();
+}
+const events = new EventSource("events");
+events.addEventListener("nodes", e => {
+    const update = JSON.parse(e.data), delta = update.nodes;
+    if (update.full) for (const n in nodes) delete nodes[n];
+    for (const n in delta) { if (delta[n] === null) delete nodes[n]; else nodes[n] = delta[n]; }
+    draw();
+});
+</script></body></html>
+"""
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    """
+    GET /            a page that follows /events
+    GET /nodes.json  the whole table, with an ETag of epoch-seq
+    GET /events      Server-Sent Events; each event is the nodes that
+                     changed since the client's Last-Event-ID (or ?since=),
+                     which is epoch-seq. A client from another epoch, or
+                     one claiming to be ahead of us, starts from 0 and
+                     so gets the whole table.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+
+    def log_message(self, format:str, *args) -> None:
+        logger = self.server.logger
+        logger is not None and logger.debug(f"{self.address_string()} {format % args}")
+
+
+    def send_body(self, body:bytes, content_type:str, etag:str=None) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag: self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        board = self.server.board
+
+        if url.path == "/":
+            self.send_body(PAGE, "text/html; charset=utf-8")
+
+        elif url.path == "/nodes.json":
+            seq, body = board.snapshot()
+            etag = f'"{board.epoch}-{seq}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+            else:
+                self.send_body(body, "application/json", etag)
+
+        elif url.path == "/events":
+            last = (self.headers.get("Last-Event-ID")
+                or parse_qs(url.query).get("since", [""])[0])
+            epoch, _, seq = last.strip().rpartition('-')
+            try:
+                seq = int(seq)
+            except ValueError:
+                seq = 0
+            if epoch != board.epoch or seq > board.seq: seq = 0
+            self.stream(board, seq)
+
+        else:
+            self.send_error(404)
+
+
+    def stream(self, board:NodeBoard, seq:int) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        try:
+            while not self.server.stopping.is_set():
+                if board.seq <= seq and not board.wait(seq, KEEPALIVE):
+                    self.wfile.write(b": keepalive\n\n")
+                elif board.seq > seq:
+                    seq, body = board.since(seq)
+                    self.wfile.write(b"id: %s-%d\nevent: nodes\ndata: %s\n\n" % (board.epoch.encode(), seq, body))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            pass
+
+
+class Dashboard(ThreadingHTTPServer):
+    """
+    One collection loop feeds a NodeBoard; every viewer reads from it.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address:tuple, logger:object=None):
+        super().__init__(address, DashboardHandler)
+        self.board = NodeBoard()
+        self.logger = logger
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.serve_forever, name="webview", daemon=True)
+
+
+    def start(self) -> 'Dashboard':
+        self.thread.start()
+        return self
+
+
+    def stop(self) -> None:
+        self.stopping.set()
+        with self.board.changed:
+            self.board.changed.notify_all()
+        self.shutdown()
+        self.server_close()
+
+
+@trap
+def serve(where:tuple, collect:Callable[[], Dict[str, dict]], refresh:int, logger:object=None) -> None:
+    """
+    Serve the dashboard at where, calling collect() every refresh
+    seconds. Runs until interrupted.
+    """
+    dashboard = Dashboard(where, logger).start()
+    logger is not None and logger.info(f"Serving the dashboard at {dashboard.server_address}")
+
+    try:
+        while True:
+            start = time.monotonic()
+            dashboard.board.update(collect())
+            time.sleep(max(1, refresh - (time.monotonic() - start)))
+
+    except KeyboardInterrupt as e:
+        pass
+
+    finally:
+        dashboard.stop()
+
+
+@trap
+def webview_main(myargs:argparse.Namespace) -> int:
+    """
+    Serve made-up nodes whose load wanders, to see the page work.
+    """
+    import random
+
+    def collect() -> Dict[str, dict]:
+        rows = {}
+        for i in range(1, myargs.n+1):
+            load = random.choice((5, 20, 30, 45, 60))
+            level = "red" if load > 52 else "yellow" if load > 39 else "green"
+            rows[f"spdr{i:02}"] = {"row": f"spdr{i:02} {load:6.2f}", "level": level}
+        return rows
+
+    serve(address(myargs.http), collect, myargs.refresh)
+    return os.EX_OK
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(prog="webview",
+        description="What webview does, webview does best.")
+
+    parser.add_argument('--http', type=str, default=":8080",
+        help="[host:]port to serve on.")
+    parser.add_argument('-n', type=int, default=20,
+        help="Number of made-up nodes.")
+    parser.add_argument('-o', '--output', type=str, default="",
+        help="Output file name")
+    parser.add_argument('-r', '--refresh', type=int, default=5,
+        help="Seconds between updates.")
+    parser.add_argument('-v', '--verbose', action='store_true',
+        help="Be chatty about what is taking place")
+
+
+    myargs = parser.parse_args()
+    verbose = myargs.verbose
+
+    try:
+        outfile = sys.stdout if not myargs.output else open(myargs.output, 'w')
+        with contextlib.redirect_stdout(outfile):
+            sys.exit(globals()[f"{os.path.basename(__file__)[:-3]}_main"](myargs))
+
+    except Exception as e:
+        print(f"Escaped or re-raised exception: {e}")